@@ -1,28 +1,128 @@
 """
 Rock-Paper-Scissors-Plus Web Application
-Flask-based web interface for the game.
+Quart (async Flask-compatible) web interface for the game.
+Run with: hypercorn app:app
 """
 import os
-from flask import Flask, render_template, request, jsonify, session
+import asyncio
+from functools import lru_cache
+import orjson
+from quart import Quart, Response, render_template, request, jsonify, session
+from quart.json.provider import DefaultJSONProvider
 from google import genai
 from google.genai import types
-from google.genai.errors import ClientError
-import time
+from google.genai.errors import APIError
+import random
 import secrets
-from game_state import GameState, GameLogic, Move, RoundResult
+from cachetools import TTLCache
+from game_state import GameState, GameLogic, RoundResult
 
-app = Flask(__name__)
+
+class OrjsonProvider(DefaultJSONProvider):
+    """JSON provider backed by orjson for faster jsonify/get_json"""
+    
+    def dumps(self, obj, **kwargs):
+        return orjson.dumps(obj, default=self.default).decode()
+    
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+
+app = Quart(__name__)
+app.json = OrjsonProvider(app)
 app.secret_key = secrets.token_hex(16)
 
-# Store game states per session
-game_sessions = {}
+# Retry policy for transient Gemini errors (429 / 5xx)
+MAX_AI_RETRIES = 3
+RETRY_BASE_DELAY = 1.0
+RETRY_MAX_DELAY = 30.0
+RETRY_JITTER = 0.5
+
+# Canned commentary used instead of a Gemini round-trip for routine events.
+# Round strings are formatted with the round number.
+INTRO_POOL = [
+    "Welcome to Rock-Paper-Scissors-Plus! Ready to play? Best of 3 rounds!",
+    "Welcome, challenger! Three rounds, one bomb each - let's see what you've got!",
+    "Rock-Paper-Scissors-Plus is ON! Best of 3, and don't forget your bomb!",
+    "Step into the arena! Best of 3 rounds - may the best move win!",
+]
+WIN_POOL = [
+    "You win round {round}! 🎉",
+    "Round {round} goes to you - nicely played! 🎉",
+    "You got me in round {round}! 😤",
+    "Round {round} is yours! Keep it up! 🔥",
+]
+LOSS_POOL = [
+    "I win round {round}! 🤖",
+    "Round {round} is mine! Better luck next time! 🤖",
+    "Gotcha in round {round}! 😎",
+    "Round {round} goes to the bot! 🤖",
+]
+DRAW_POOL = [
+    "Round {round} is a draw!",
+    "Great minds think alike - round {round} is a draw! 🤝",
+    "Stalemate in round {round}!",
+    "Round {round}: nobody blinks. It's a draw! 🤝",
+]
+COMMENTARY_POOLS = {
+    RoundResult.USER_WIN: WIN_POOL,
+    RoundResult.BOT_WIN: LOSS_POOL,
+    RoundResult.DRAW: DRAW_POOL,
+}
+
+# One Gemini call per game, made in the background: a quip for every round
+# outcome.
+# Rounds 1-2 use round{n}_{outcome}; round 3 uses final_{game winner}.
+QUIP_OUTCOMES = {
+    RoundResult.USER_WIN: 'win',
+    RoundResult.BOT_WIN: 'lose',
+    RoundResult.DRAW: 'draw',
+}
+FINAL_QUIP_OUTCOMES = {'user': 'win', 'bot': 'lose', 'draw': 'draw'}
+QUIP_KEYS = [
+    f"round{n}_{outcome}" for n in (1, 2) for outcome in ('win', 'lose', 'draw')
+] + [f"final_{outcome}" for outcome in ('win', 'lose', 'draw')]
+QUIPS_PROMPT = (
+    "You are the referee of a best-of-3 Rock-Paper-Scissors-Plus game "
+    "(each side may play bomb once; bomb beats everything except bomb). "
+    "Return a JSON object with these string keys: " + ", ".join(QUIP_KEYS) + ". "
+    "'roundN_win'/'roundN_lose'/'roundN_draw' is a brief, fun one-sentence comment "
+    "for when the player wins/loses/draws round N. "
+    "'final_win'/'final_lose'/'final_draw' is an enthusiastic one-sentence comment "
+    "for when the player wins/loses/draws the whole match."
+)
+QUIPS_CONFIG = types.GenerateContentConfig(response_mime_type='application/json')
+
+# Quips are fetched in the background, at most one fetch per session and
+# QUIP_FETCH_LIMIT overall; games started beyond that use the canned pools.
+# Serverless hosts (Vercel) may freeze the function once the response is
+# sent, so background fetching is disabled there.
+QUIP_FETCH_LIMIT = 32
+QUIP_FETCH_ENABLED = not os.environ.get("VERCEL")
+quip_fetches = set()
+
+# Store game states per session (in-process; a multi-worker deployment
+# needs a shared store such as Redis instead). Bounded so abandoned
+# sessions are evicted rather than kept forever.
+SESSION_CACHE_SIZE = 10_000
+SESSION_TTL_SECONDS = 3600
+game_sessions = TTLCache(maxsize=SESSION_CACHE_SIZE, ttl=SESSION_TTL_SECONDS)
 
 
 def get_or_create_game_state(session_id):
     """Get or create a game state for the session"""
-    if session_id not in game_sessions:
-        game_sessions[session_id] = GameState()
-    return game_sessions[session_id]
+    # Single lookup: with a TTL cache the entry can expire between an
+    # `in` check and indexing
+    game_state = game_sessions.get(session_id)
+    if game_state is None:
+        game_state = game_sessions[session_id] = GameState()
+    return game_state
+
+
+@lru_cache(maxsize=1)
+def get_ai_client():
+    """Shared Google AI client, created on first use and reused across requests"""
+    return create_ai_client()
 
 
 def create_ai_client():
@@ -33,44 +133,118 @@ def create_ai_client():
     return genai.Client(api_key=api_key)
 
 
-def get_ai_response(message, retry_count=0):
-    """Get response from AI with retry logic"""
+def is_transient_error(error):
+    """Only rate limits and server-side failures are worth retrying"""
+    code = getattr(error, 'code', None) or 0
+    return code == 429 or code >= 500 or "RESOURCE_EXHAUSTED" in str(error)
+
+
+def retry_delay(attempt):
+    """Exponential backoff with random jitter, capped at RETRY_MAX_DELAY"""
+    delay = RETRY_BASE_DELAY * (2 ** attempt) + random.uniform(0, RETRY_JITTER)
+    return min(delay, RETRY_MAX_DELAY)
+
+
+async def get_ai_response(message, config=None):
+    """Get response from AI with retry logic (non-blocking)"""
+    client = get_ai_client()
+    for attempt in range(MAX_AI_RETRIES + 1):
+        try:
+            response = await client.aio.models.generate_content(
+                model="gemini-2.5-flash",
+                contents=message,
+                config=config
+            )
+            return response.text
+        except APIError as e:
+            if is_transient_error(e) and attempt < MAX_AI_RETRIES:
+                await asyncio.sleep(retry_delay(attempt))
+                continue
+            raise
+
+
+async def stream_ai_response(message):
+    """Yield response text from AI chunk by chunk as it is generated"""
+    client = get_ai_client()
+    stream = await client.aio.models.generate_content_stream(
+        model="gemini-2.5-flash",
+        contents=message
+    )
+    async for chunk in stream:
+        if chunk.text:
+            yield chunk.text
+
+
+def sse_event(event, payload):
+    """Format a Server-Sent Event with a JSON payload"""
+    return f"event: {event}\ndata: {orjson.dumps(payload).decode()}\n\n"
+
+
+async def get_game_quips():
+    """Fetch all round quips for a game in a single call"""
+    quips = orjson.loads(await get_ai_response(QUIPS_PROMPT, config=QUIPS_CONFIG))
+    if not isinstance(quips, dict):
+        raise ValueError("Expected a JSON object of quips")
+    return {key: value for key, value in quips.items() if isinstance(value, str)}
+
+
+def start_quip_fetch(session_id, game_state):
+    """Schedule load_game_quips unless disabled, pending or over the limit"""
+    if (not QUIP_FETCH_ENABLED
+            or session_id in quip_fetches
+            or len(quip_fetches) >= QUIP_FETCH_LIMIT):
+        return
+    quip_fetches.add(session_id)
+    app.add_background_task(load_game_quips, session_id, game_state)
+
+
+async def load_game_quips(session_id, game_state):
+    """
+    Background task: fetch quips and merge them into game_state.quips.
+    
+    The dict is updated in place because it is shared with the state
+    copies apply_round makes, so rounds played after this finishes see it.
+    Until then (or if it fails) play_round falls back to the canned pools.
+    """
     try:
-        client = create_ai_client()
-        response = client.models.generate_content(
-            model="gemini-2.5-flash",
-            contents=message
-        )
-        return response.text
-    except ClientError as e:
-        if "RESOURCE_EXHAUSTED" in str(e) and retry_count < 2:
-            time.sleep(2)
-            return get_ai_response(message, retry_count + 1)
-        raise
+        quips = await get_game_quips()
+    except Exception:
+        return
+    finally:
+        quip_fetches.discard(session_id)
+    game_state.quips.update(quips)
+
+
+def quip_key(game_state, result, winner):
+    """Key into GameState.quips for the round that was just played"""
+    if game_state.game_over:
+        return f"final_{FINAL_QUIP_OUTCOMES[winner]}"
+    return f"round{game_state.round_number}_{QUIP_OUTCOMES[result]}"
+
+
+def ai_requested():
+    """Whether the client asked for live Gemini commentary (?ai=true)"""
+    return request.args.get('ai', '').lower() == 'true'
 
 
 @app.route('/')
-def index():
+async def index():
     """Main game page"""
     if 'session_id' not in session:
         session['session_id'] = secrets.token_hex(16)
-    return render_template('index.html')
+    return await render_template('index.html')
 
 
 @app.route('/api/start', methods=['POST'])
-def start_game():
+async def start_game():
     """Start a new game"""
     session_id = session.get('session_id')
     game_state = GameState()
     game_sessions[session_id] = game_state
     
-    try:
-        intro = get_ai_response(
-            "Welcome the player to Rock-Paper-Scissors-Plus in 1-2 sentences. "
-            "Be enthusiastic and brief."
-        )
-    except:
-        intro = "Welcome to Rock-Paper-Scissors-Plus! Ready to play? Best of 3 rounds!"
+    # Quips are fetched off the request path; the intro is always canned
+    start_quip_fetch(session_id, game_state)
+    intro = random.choice(INTRO_POOL)
     
     return jsonify({
         'success': True,
@@ -80,111 +254,98 @@ def start_game():
 
 
 @app.route('/api/play', methods=['POST'])
-def play_round():
+async def play_round():
     """Play a round"""
     session_id = session.get('session_id')
-    game_state = get_or_create_game_state(session_id)
+    data = await request.get_json()
     
-    data = request.json
-    user_move = data.get('move', '').lower()
-    
-    # Validate move
-    is_valid, user_move_enum, error_msg = GameLogic.validate_move(
-        user_move,
-        game_state.user_bomb_used
-    )
+    # Read, advance and store the state with no await in between, so
+    # concurrent requests (or a reset) can't overwrite each other's round
+    game_state = get_or_create_game_state(session_id)
+    game_state, round_result = GameLogic.apply_round(game_state, data.get('move', ''))
+    game_sessions[session_id] = game_state
     
-    if not is_valid:
-        game_state.round_number += 1
-        if game_state.round_number >= 3:
-            game_state.game_over = True
-        
+    # Fast path for rejected moves: no commentary and no Gemini call, just
+    # the fields the client needs, taken straight from the round result.
+    # Keep this path cheap; invalid input is common.
+    if round_result['result'] == RoundResult.INVALID.value:
         return jsonify({
             'success': False,
-            'error': error_msg,
-            'round': game_state.round_number,
-            'game_over': game_state.game_over,
-            'state': game_state.to_dict()
+            'error': round_result['error_message'],
+            'round': round_result['round_number'],
+            'user_score': round_result['user_score'],
+            'bot_score': round_result['bot_score'],
+            'game_over': round_result['game_over']
         })
     
-    # Bot chooses move
-    import random
-    available_moves = [Move.ROCK, Move.PAPER, Move.SCISSORS]
-    if not game_state.bot_bomb_used and random.random() < 0.15:
-        available_moves.append(Move.BOMB)
-    bot_move_enum = random.choice(available_moves)
-    
-    # Update bomb usage
-    if user_move_enum == Move.BOMB:
-        game_state.user_bomb_used = True
-    if bot_move_enum == Move.BOMB:
-        game_state.bot_bomb_used = True
-    
-    # Resolve round
-    result = GameLogic.resolve_round(user_move_enum, bot_move_enum)
+    result = RoundResult(round_result['result'])
+    user_move = round_result['user_move']
+    bot_move = round_result['bot_move']
+    winner = GameLogic.determine_game_winner(game_state) if game_state.game_over else None
     
-    # Update scores
-    if result == RoundResult.USER_WIN:
-        game_state.user_score += 1
-    elif result == RoundResult.BOT_WIN:
-        game_state.bot_score += 1
-    
-    # Increment round
-    game_state.round_number += 1
-    
-    # Record history
-    game_state.rounds_history.append({
-        'round': game_state.round_number,
-        'user_move': user_move_enum.value,
-        'bot_move': bot_move_enum.value,
-        'result': result.value
-    })
-    
-    # Check if game over
-    if game_state.round_number >= 3:
-        game_state.game_over = True
-        winner = GameLogic.determine_game_winner(game_state)
-    else:
-        winner = None
-    
-    # Generate AI commentary
-    try:
+    # Commentary comes from the quips fetched at game start (or the canned
+    # pools); a live Gemini call is only made when the client asks for it
+    commentary = game_state.quips.get(quip_key(game_state, result, winner))
+    if not commentary:
+        commentary = random.choice(COMMENTARY_POOLS[result]).format(round=game_state.round_number)
+    prompt = None
+    if ai_requested():
         if game_state.game_over:
-            prompt = f"Round {game_state.round_number}: User played {user_move_enum.value}, bot played {bot_move_enum.value}. Result: {result.value}. Final score: User {game_state.user_score} - Bot {game_state.bot_score}. Winner: {winner}. Give a brief, enthusiastic final comment (1 sentence)."
+            prompt = f"Round {game_state.round_number}: User played {user_move}, bot played {bot_move}. Result: {result.value}. Final score: User {game_state.user_score} - Bot {game_state.bot_score}. Winner: {winner}. Give a brief, enthusiastic final comment (1 sentence)."
         else:
-            prompt = f"Round {game_state.round_number}: User played {user_move_enum.value}, bot played {bot_move_enum.value}. Result: {result.value}. Current score: User {game_state.user_score} - Bot {game_state.bot_score}. Give a brief, fun comment (1 sentence)."
-        
-        commentary = get_ai_response(prompt)
-    except:
-        if result == RoundResult.USER_WIN:
-            commentary = f"You win round {game_state.round_number}! 🎉"
-        elif result == RoundResult.BOT_WIN:
-            commentary = f"I win round {game_state.round_number}! 🤖"
-        else:
-            commentary = f"Round {game_state.round_number} is a draw!"
+            prompt = f"Round {game_state.round_number}: User played {user_move}, bot played {bot_move}. Result: {result.value}. Current score: User {game_state.user_score} - Bot {game_state.bot_score}. Give a brief, fun comment (1 sentence)."
     
-    return jsonify({
+    round_data = {
         'success': True,
         'round': game_state.round_number,
-        'user_move': user_move_enum.value,
-        'bot_move': bot_move_enum.value,
+        'user_move': user_move,
+        'bot_move': bot_move,
         'result': result.value,
         'user_score': game_state.user_score,
         'bot_score': game_state.bot_score,
         'game_over': game_state.game_over,
         'winner': winner,
-        'commentary': commentary,
         'user_bomb_used': game_state.user_bomb_used,
         'bot_bomb_used': game_state.bot_bomb_used,
         'state': game_state.to_dict()
-    })
+    }
+    
+    async def events():
+        # Round outcome first, then commentary as it is produced
+        yield sse_event('state', round_data)
+        streamed = False
+        if prompt:
+            chunks = stream_ai_response(prompt)
+            try:
+                while True:
+                    # Only the Gemini stream is guarded; yields stay outside
+                    # the try so client disconnects propagate normally
+                    try:
+                        text = await anext(chunks)
+                    except Exception:
+                        # End of stream (StopAsyncIteration) or API failure
+                        break
+                    streamed = True
+                    yield sse_event('commentary', text)
+            finally:
+                await chunks.aclose()
+        if not streamed:
+            yield sse_event('commentary', commentary)
+        yield sse_event('done', {})
+    
+    return Response(
+        events(),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache'}
+    )
 
 
 @app.route('/api/reset', methods=['POST'])
-def reset_game():
+async def reset_game():
     """Reset the game"""
     session_id = session.get('session_id')
-    game_sessions[session_id] = GameState()
+    # Drop the entry; a fresh state is created on the next start/play
+    game_sessions.pop(session_id, None)
     
     return jsonify({
         'success': True,
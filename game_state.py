@@ -2,17 +2,23 @@
 Game State Management for Rock-Paper-Scissors-Plus
 Handles all game state tracking and validation logic.
 """
-from dataclasses import dataclass
+import random
+from copy import deepcopy
+from dataclasses import dataclass, field
 from typing import Literal, Optional
-from enum import Enum
+from enum import Enum, IntEnum
 
 
-class Move(Enum):
-    """Valid game moves"""
-    ROCK = "rock"
-    PAPER = "paper"
-    SCISSORS = "scissors"
-    BOMB = "bomb"
+class Move(IntEnum):
+    """Valid game moves, encoded as small ints (see MOVE_NAMES for strings)"""
+    ROCK = 0
+    PAPER = 1
+    SCISSORS = 2
+    BOMB = 3
+
+
+# Move code -> name; moves are only turned into strings for responses
+MOVE_NAMES = ("rock", "paper", "scissors", "bomb")
 
 
 class RoundResult(Enum):
@@ -23,35 +29,189 @@ class RoundResult(Enum):
     INVALID = "invalid"
 
 
-@dataclass
+def _build_outcome_table() -> tuple[RoundResult, ...]:
+    """
+    Precompute the result of every (user_move, bot_move) pairing as a flat
+    tuple indexed by user_move * 4 + bot_move.
+
+    Rules:
+    - bomb beats everything except bomb
+    - bomb vs bomb is a draw
+    - rock > scissors > paper > rock
+    """
+    beats = {
+        Move.ROCK: Move.SCISSORS,
+        Move.SCISSORS: Move.PAPER,
+        Move.PAPER: Move.ROCK
+    }
+    table = []
+    for user_move in Move:
+        for bot_move in Move:
+            if user_move == bot_move:
+                result = RoundResult.DRAW
+            elif user_move == Move.BOMB:
+                result = RoundResult.USER_WIN
+            elif bot_move == Move.BOMB:
+                result = RoundResult.BOT_WIN
+            elif beats[user_move] == bot_move:
+                result = RoundResult.USER_WIN
+            else:
+                result = RoundResult.BOT_WIN
+            table.append(result)
+    return tuple(table)
+
+
+# Move parsing: name -> code, no exception path on unknown input
+_MOVE_BY_NAME = {name: Move(code) for code, name in enumerate(MOVE_NAMES)}
+
+# Error messages for rejected moves
+INVALID_MOVE_MSG = "Invalid move '{move}'. Valid moves: rock, paper, scissors, bomb"
+BOMB_USED_MSG = "Bomb has already been used this game"
+GAME_OVER_MSG = "Game is over. Start a new game to play again."
+
+# Bot move weights. The bot adds bomb to its pool 15% of the time and then
+# picks uniformly, i.e. bomb 0.15/4 and each other move 0.85/3 + 0.15/4
+# (scaled by 240 to integers).
+_BOT_MOVES = tuple(Move)
+_W_BOMB = (77, 77, 77, 9)
+_W_NOBOMB = (1, 1, 1, 0)
+
+# All 16 outcomes, resolved once at import time
+_OUTCOME_FLAT = _build_outcome_table()
+
+
+# Bit layout of GameState._state. A game lasts at most 3 rounds, so every
+# counter fits in 2 bits and every flag in 1.
+_USER_SCORE_SHIFT = 0
+_BOT_SCORE_SHIFT = 2
+_ROUND_SHIFT = 4
+_USER_BOMB_SHIFT = 6
+_BOT_BOMB_SHIFT = 7
+_GAME_OVER_SHIFT = 8
+_COUNTER_MASK = 0b11
+_FLAG_MASK = 0b1
+
+# Round records are packed into one byte each:
+# round << 6 | result << 4 | user_move << 2 | bot_move
+_RESULT_CODES = (RoundResult.DRAW, RoundResult.USER_WIN, RoundResult.BOT_WIN)
+_RESULT_INDEX = {r: i for i, r in enumerate(_RESULT_CODES)}
+
+
+def _packed_field(shift: int, mask: int, cast=int) -> property:
+    """Property reading/writing a bit field of GameState._state"""
+    def getter(self):
+        return cast((self._state >> shift) & mask)
+
+    def setter(self, value):
+        value = int(value)
+        if value & ~mask:
+            raise ValueError(f"Value {value} does not fit in game state field")
+        self._state = (self._state & ~(mask << shift)) | (value << shift)
+
+    return property(getter, setter)
+
+
+class _ReadOnlyDict(dict):
+    """
+    dict that rejects mutation, so a cached to_dict() can't be corrupted.
+    Copying or pickling it yields a plain (mutable) dict.
+    """
+    
+    def _readonly(self, *args, **kwargs):
+        raise TypeError("GameState.to_dict() result is read-only")
+    
+    __setitem__ = __delitem__ = __ior__ = _readonly
+    clear = pop = popitem = setdefault = update = _readonly
+    
+    def __copy__(self):
+        return dict(self)
+    
+    def __deepcopy__(self, memo):
+        return deepcopy(dict(self), memo)
+    
+    def __reduce__(self):
+        return (dict, (dict(self),))
+
+
+@dataclass(slots=True)
 class GameState:
     """
     Maintains complete game state across rounds.
     State persists in this object rather than just in conversation history.
+    
+    Scores, round number and flags are packed into the private int
+    `_state`; round history is one byte per round in the append-only
+    `_history`. Both change only through the field properties and
+    record_round, so (_state, len(_history)) identifies the state and keys
+    the memoized to_dict() result. `quips` holds the commentary generated
+    for this game, keyed by round outcome.
     """
-    round_number: int = 0
-    user_score: int = 0
-    bot_score: int = 0
-    user_bomb_used: bool = False
-    bot_bomb_used: bool = False
-    game_over: bool = False
-    rounds_history: list = None
-    
-    def __post_init__(self):
-        if self.rounds_history is None:
-            self.rounds_history = []
+    _state: int = 0
+    _history: bytearray = field(default_factory=bytearray)
+    quips: dict = field(default_factory=dict)
+    _dict_cache: Optional[tuple[tuple[int, int], dict]] = field(
+        default=None, init=False, repr=False, compare=False
+    )
+    
+    user_score = _packed_field(_USER_SCORE_SHIFT, _COUNTER_MASK)
+    bot_score = _packed_field(_BOT_SCORE_SHIFT, _COUNTER_MASK)
+    round_number = _packed_field(_ROUND_SHIFT, _COUNTER_MASK)
+    user_bomb_used = _packed_field(_USER_BOMB_SHIFT, _FLAG_MASK, bool)
+    bot_bomb_used = _packed_field(_BOT_BOMB_SHIFT, _FLAG_MASK, bool)
+    game_over = _packed_field(_GAME_OVER_SHIFT, _FLAG_MASK, bool)
+    
+    def copy(self) -> "GameState":
+        """Independent copy of the game; quips are shared"""
+        return GameState(self._state, bytearray(self._history), self.quips)
+    
+    def record_round(self, user_move: Move, bot_move: Move, result: RoundResult):
+        """Append the current round to the history"""
+        self._history.append(
+            self.round_number << 6
+            | _RESULT_INDEX[result] << 4
+            | user_move << 2
+            | bot_move
+        )
+    
+    @property
+    def rounds_history(self) -> tuple:
+        """Decoded round history"""
+        return tuple([
+            {
+                "round": record >> 6,
+                "user_move": MOVE_NAMES[(record >> 2) & 0b11],
+                "bot_move": MOVE_NAMES[record & 0b11],
+                "result": _RESULT_CODES[(record >> 4) & 0b11].value
+            }
+            for record in self._history
+        ])
     
     def to_dict(self) -> dict:
-        """Convert state to dictionary for tool returns"""
-        return {
-            "round_number": self.round_number,
-            "user_score": self.user_score,
-            "bot_score": self.bot_score,
-            "user_bomb_used": self.user_bomb_used,
-            "bot_bomb_used": self.bot_bomb_used,
-            "game_over": self.game_over,
-            "rounds_history": self.rounds_history
-        }
+        """
+        Convert state to dictionary for tool returns.
+        
+        The result is cached until the next mutation, which pays off when
+        the referee tools read the same state several times between rounds
+        (the web handlers read each state once). It is read-only: the
+        top-level dict raises TypeError on mutation and rounds_history is a
+        tuple whose round records must not be modified.
+        """
+        key = (self._state, len(self._history))
+        cache = self._dict_cache
+        if cache is not None and cache[0] == key:
+            return cache[1]
+        state = self._state
+        result = _ReadOnlyDict(
+            round_number=(state >> _ROUND_SHIFT) & _COUNTER_MASK,
+            user_score=(state >> _USER_SCORE_SHIFT) & _COUNTER_MASK,
+            bot_score=(state >> _BOT_SCORE_SHIFT) & _COUNTER_MASK,
+            user_bomb_used=bool((state >> _USER_BOMB_SHIFT) & _FLAG_MASK),
+            bot_bomb_used=bool((state >> _BOT_BOMB_SHIFT) & _FLAG_MASK),
+            game_over=bool((state >> _GAME_OVER_SHIFT) & _FLAG_MASK),
+            rounds_history=self.rounds_history
+        )
+        self._dict_cache = (key, result)
+        return result
 
 
 class GameLogic:
@@ -71,48 +231,105 @@ class GameLogic:
         move_lower = move.lower().strip()
         
         # Check if move is valid
-        try:
-            parsed_move = Move(move_lower)
-        except ValueError:
-            return False, None, f"Invalid move '{move}'. Valid moves: rock, paper, scissors, bomb"
+        parsed_move = _MOVE_BY_NAME.get(move_lower)
+        if parsed_move is None:
+            return False, None, INVALID_MOVE_MSG.format(move=move)
         
         # Check bomb usage
         if parsed_move == Move.BOMB and player_bomb_used:
-            return False, None, "Bomb has already been used this game"
+            return False, None, BOMB_USED_MSG
         
         return True, parsed_move, ""
     
+    @staticmethod
+    def choose_bot_move(bot_bomb_used: bool) -> Move:
+        """Pick the bot's move with a single weighted draw"""
+        weights = _W_NOBOMB if bot_bomb_used else _W_BOMB
+        return random.choices(_BOT_MOVES, weights, k=1)[0]
+    
     @staticmethod
     def resolve_round(user_move: Move, bot_move: Move) -> RoundResult:
         """
         Determine the winner of a round based on moves.
         
-        Rules:
-        - bomb beats everything except bomb
-        - bomb vs bomb is a draw
-        - rock > scissors > paper > rock
+        Single lookup into the precomputed outcome table
+        (see _build_outcome_table for the rules).
+        """
+        return _OUTCOME_FLAT[user_move * 4 + bot_move]
+    
+    @staticmethod
+    def apply_round(state: GameState, user_move: str) -> tuple[GameState, dict]:
+        """
+        Play one round against the given state without mutating it.
+        
+        Validates the move, picks the bot move, resolves the round and
+        updates scores, bomb usage, round count and history. An invalid
+        move still uses up the round.
+        
+        Returns:
+            (new_state, round_result_dict)
         """
-        # Handle bomb cases
-        if user_move == Move.BOMB and bot_move == Move.BOMB:
-            return RoundResult.DRAW
-        if user_move == Move.BOMB:
-            return RoundResult.USER_WIN
-        if bot_move == Move.BOMB:
-            return RoundResult.BOT_WIN
+        if state.game_over:
+            return state, {
+                "round_number": state.round_number,
+                "result": RoundResult.INVALID.value,
+                "error_message": GAME_OVER_MSG,
+                "user_move": user_move,
+                "bot_move": None,
+                "user_score": state.user_score,
+                "bot_score": state.bot_score,
+                "game_over": True
+            }
         
-        # Standard RPS rules
-        winning_moves = {
-            Move.ROCK: Move.SCISSORS,
-            Move.SCISSORS: Move.PAPER,
-            Move.PAPER: Move.ROCK
-        }
+        new_state = state.copy()
+        is_valid, user_move_enum, error_msg = GameLogic.validate_move(
+            user_move,
+            new_state.user_bomb_used
+        )
         
-        if user_move == bot_move:
-            return RoundResult.DRAW
-        elif winning_moves[user_move] == bot_move:
-            return RoundResult.USER_WIN
-        else:
-            return RoundResult.BOT_WIN
+        if not is_valid:
+            new_state.round_number += 1
+            if new_state.round_number >= 3:
+                new_state.game_over = True
+            return new_state, {
+                "round_number": new_state.round_number,
+                "result": RoundResult.INVALID.value,
+                "error_message": error_msg,
+                "user_move": user_move,
+                "bot_move": None,
+                "user_score": new_state.user_score,
+                "bot_score": new_state.bot_score,
+                "game_over": new_state.game_over
+            }
+        
+        bot_move_enum = GameLogic.choose_bot_move(new_state.bot_bomb_used)
+        if user_move_enum == Move.BOMB:
+            new_state.user_bomb_used = True
+        if bot_move_enum == Move.BOMB:
+            new_state.bot_bomb_used = True
+        
+        result = GameLogic.resolve_round(user_move_enum, bot_move_enum)
+        if result == RoundResult.USER_WIN:
+            new_state.user_score += 1
+        elif result == RoundResult.BOT_WIN:
+            new_state.bot_score += 1
+        
+        new_state.round_number += 1
+        new_state.record_round(user_move_enum, bot_move_enum, result)
+        if new_state.round_number >= 3:
+            new_state.game_over = True
+        
+        return new_state, {
+            "round_number": new_state.round_number,
+            "result": result.value,
+            "user_move": MOVE_NAMES[user_move_enum],
+            "bot_move": MOVE_NAMES[bot_move_enum],
+            "user_score": new_state.user_score,
+            "bot_score": new_state.bot_score,
+            "game_over": new_state.game_over,
+            "user_bomb_used": new_state.user_bomb_used,
+            "bot_bomb_used": new_state.bot_bomb_used
+        }
     
     @staticmethod
     def determine_game_winner(state: GameState) -> str:
@@ -9,13 +9,10 @@ from google.genai import types
 from google.genai.errors import ClientError
 from referee_agent import (
     create_referee_agent,
-    get_system_instruction,
-    TOOL_FUNCTIONS,
-    validate_move_declaration,
-    play_round_declaration,
-    get_state_declaration,
-    reset_game_declaration,
-    game_state
+    CHAT_CONFIG,
+    TOOL_DISPATCH,
+    current_game_state,
+    new_game_session
 )
 
 
@@ -30,23 +27,14 @@ def run_game():
         print("Please set it with: export GOOGLE_API_KEY='your-api-key'")
         return
     
+    # Fresh game state for this session
+    new_game_session()
+    
     # Create the AI client
     client = create_referee_agent(api_key)
     
     # Initialize chat with system instruction and tools
-    chat = client.chats.create(
-        model="gemini-2.5-flash",
-        config=types.GenerateContentConfig(
-            system_instruction=get_system_instruction(),
-            tools=[
-                validate_move_declaration,
-                play_round_declaration,
-                get_state_declaration,
-                reset_game_declaration
-            ],
-            temperature=0.7
-        )
-    )
+    chat = client.chats.create(model="gemini-2.5-flash", config=CHAT_CONFIG)
     
     print("=" * 60)
     print("🎮 ROCK-PAPER-SCISSORS-PLUS REFEREE 🎮")
@@ -66,7 +54,7 @@ def run_game():
             raise
     
     # Game loop
-    while not game_state.game_over:
+    while not current_game_state().game_over:
         # Get user input
         user_input = input("Your move: ").strip()
         
@@ -92,18 +80,18 @@ def run_game():
                 continue
         
         # Handle tool calls
-        while response.candidates[0].content.parts:
-            part = response.candidates[0].content.parts[0]
+        while parts := response.candidates[0].content.parts:
+            part = parts[0]
             
             # Check if there's a function call
-            if hasattr(part, 'function_call') and part.function_call:
-                function_call = part.function_call
+            function_call = getattr(part, 'function_call', None)
+            if function_call:
                 function_name = function_call.name
-                function_args = dict(function_call.args)
                 
                 # Execute the tool
-                if function_name in TOOL_FUNCTIONS:
-                    result = TOOL_FUNCTIONS[function_name](**function_args)
+                tool = TOOL_DISPATCH.get(function_name)
+                if tool:
+                    result = tool(function_call.args or {})
                     
                     # Send result back to model with retry logic
                     try:
@@ -135,6 +123,7 @@ def run_game():
                 break
     
     # Game ended
+    game_state = current_game_state()
     if game_state.game_over:
         print("\n" + "=" * 60)
         print("🏁 GAME OVER 🏁")
@@ -2,14 +2,52 @@
 AI Game Referee Agent using Google ADK
 Handles intent understanding and response generation.
 """
-import random
+from contextvars import ContextVar
+from dataclasses import dataclass, field
 from google import genai
 from google.genai import types
-from game_state import GameState, GameLogic, Move, RoundResult
+from game_state import GameState, GameLogic, MOVE_NAMES
 
 
-# Global game state (persists across agent calls)
-game_state = GameState()
+@dataclass(slots=True)
+class _RefereeSession:
+    """Mutable holder for one session's game state"""
+    game_state: GameState = field(default_factory=GameState)
+
+
+# Session for the current context. new_game_session() binds a holder once
+# per session; tools replace holder.game_state in place rather than calling
+# set() again, so rounds persist even when a tool runs in a copied context
+# (a new asyncio task, to_thread or an executor) spawned from the session's
+# context. Sessions bound in separate contexts never share a board.
+_SESSION: ContextVar[_RefereeSession] = ContextVar("referee_session")
+
+
+def new_game_session() -> GameState:
+    """Bind a fresh session to the current context (call once per session)"""
+    session = _RefereeSession()
+    _SESSION.set(session)
+    return session.game_state
+
+
+def _current_session() -> _RefereeSession:
+    """
+    Return the session bound to the current context.
+    
+    If none is bound, one is created, but it only persists within the
+    current context; callers should use new_game_session() up front.
+    """
+    try:
+        return _SESSION.get()
+    except LookupError:
+        session = _RefereeSession()
+        _SESSION.set(session)
+        return session
+
+
+def current_game_state() -> GameState:
+    """Return the game state of the current session"""
+    return _current_session().game_state
 
 
 def validate_move_tool(move: str) -> dict:
@@ -22,6 +60,7 @@ def validate_move_tool(move: str) -> dict:
     Returns:
         Dictionary with validation result and updated state
     """
+    game_state = current_game_state()
     is_valid, parsed_move, error_msg = GameLogic.validate_move(
         move, 
         game_state.user_bomb_used
@@ -29,7 +68,7 @@ def validate_move_tool(move: str) -> dict:
     
     return {
         "is_valid": is_valid,
-        "parsed_move": parsed_move.value if parsed_move else None,
+        "parsed_move": MOVE_NAMES[parsed_move] if parsed_move is not None else None,
         "error_message": error_msg,
         "current_state": game_state.to_dict()
     }
@@ -45,84 +84,9 @@ def play_round_tool(user_move: str) -> dict:
     Returns:
         Dictionary with round results and updated game state
     """
-    global game_state
-    
-    # Validate user move
-    is_valid, user_move_enum, error_msg = GameLogic.validate_move(
-        user_move,
-        game_state.user_bomb_used
-    )
-    
-    if not is_valid:
-        # Invalid move wastes the round
-        game_state.round_number += 1
-        
-        # Check if game should end
-        if game_state.round_number >= 3:
-            game_state.game_over = True
-        
-        return {
-            "round_number": game_state.round_number,
-            "result": "invalid",
-            "error_message": error_msg,
-            "user_move": user_move,
-            "bot_move": None,
-            "user_score": game_state.user_score,
-            "bot_score": game_state.bot_score,
-            "game_over": game_state.game_over
-        }
-    
-    # Bot decides its move (random selection, avoiding bomb if already used)
-    available_moves = [Move.ROCK, Move.PAPER, Move.SCISSORS]
-    if not game_state.bot_bomb_used:
-        # Bot has a small chance to use bomb strategically
-        if random.random() < 0.15:  # 15% chance
-            available_moves.append(Move.BOMB)
-    
-    bot_move_enum = random.choice(available_moves)
-    
-    # Update bomb usage
-    if user_move_enum == Move.BOMB:
-        game_state.user_bomb_used = True
-    if bot_move_enum == Move.BOMB:
-        game_state.bot_bomb_used = True
-    
-    # Resolve the round
-    result = GameLogic.resolve_round(user_move_enum, bot_move_enum)
-    
-    # Update scores
-    if result == RoundResult.USER_WIN:
-        game_state.user_score += 1
-    elif result == RoundResult.BOT_WIN:
-        game_state.bot_score += 1
-    
-    # Increment round
-    game_state.round_number += 1
-    
-    # Record round history
-    round_record = {
-        "round": game_state.round_number,
-        "user_move": user_move_enum.value,
-        "bot_move": bot_move_enum.value,
-        "result": result.value
-    }
-    game_state.rounds_history.append(round_record)
-    
-    # Check if game is over
-    if game_state.round_number >= 3:
-        game_state.game_over = True
-    
-    return {
-        "round_number": game_state.round_number,
-        "result": result.value,
-        "user_move": user_move_enum.value,
-        "bot_move": bot_move_enum.value,
-        "user_score": game_state.user_score,
-        "bot_score": game_state.bot_score,
-        "game_over": game_state.game_over,
-        "user_bomb_used": game_state.user_bomb_used,
-        "bot_bomb_used": game_state.bot_bomb_used
-    }
+    session = _current_session()
+    session.game_state, round_result = GameLogic.apply_round(session.game_state, user_move)
+    return round_result
 
 
 def get_game_state_tool() -> dict:
@@ -132,7 +96,7 @@ def get_game_state_tool() -> dict:
     Returns:
         Current game state as dictionary
     """
-    return game_state.to_dict()
+    return current_game_state().to_dict()
 
 
 def reset_game_tool() -> dict:
@@ -142,11 +106,11 @@ def reset_game_tool() -> dict:
     Returns:
         Confirmation of reset
     """
-    global game_state
-    game_state = GameState()
+    session = _current_session()
+    session.game_state = GameState()
     return {
         "message": "Game has been reset",
-        "state": game_state.to_dict()
+        "state": session.game_state.to_dict()
     }
 
 
@@ -216,12 +180,34 @@ reset_game_declaration = types.Tool(
 )
 
 
-# Tool mapping for execution
-TOOL_FUNCTIONS = {
-    "validate_move": validate_move_tool,
-    "play_round": play_round_tool,
-    "get_game_state": get_game_state_tool,
-    "reset_game": reset_game_tool
+# All tools exposed to the referee model
+TOOLS = [
+    validate_move_declaration,
+    play_round_declaration,
+    get_state_declaration,
+    reset_game_declaration
+]
+
+
+def missing_argument_result(name: str) -> dict:
+    """Error returned to the model when a tool call omits a required argument"""
+    return {"error_message": f"Missing required argument '{name}'"}
+
+
+# Tool mapping for execution: each entry takes the raw function_call.args
+# and pulls out the parameters its tool declares. A malformed call gets an
+# error result instead of running the tool, so it never costs a round.
+TOOL_DISPATCH = {
+    "validate_move": lambda args: (
+        validate_move_tool(args["move"]) if "move" in args
+        else missing_argument_result("move")
+    ),
+    "play_round": lambda args: (
+        play_round_tool(args["user_move"]) if "user_move" in args
+        else missing_argument_result("user_move")
+    ),
+    "get_game_state": lambda args: get_game_state_tool(),
+    "reset_game": lambda args: reset_game_tool()
 }
 
 
@@ -271,3 +257,11 @@ IMPORTANT:
 - Invalid moves waste a round (round count increments)
 - After 3 rounds, game MUST end with final results
 - Be friendly but professional"""
+
+
+# Chat configuration shared by every referee chat session
+CHAT_CONFIG = types.GenerateContentConfig(
+    system_instruction=get_system_instruction(),
+    tools=TOOLS,
+    temperature=0.7
+)